@@ -0,0 +1,370 @@
+################################################
+# Golden-output regression harness for task_ugmrtpb.
+#
+# Keeps frozen copies of the original array math of _linfit, _dividePB,
+# _calcPBAlpha and _compute_alpha_beta, runs every execution path that
+# task_ugmrtpb provides on the same synthetic inputs, and reports the max
+# absolute and relative difference per output next to the speedup.
+#
+# Run from the directory holding task_ugmrtpb.py. Only numpy and scipy are
+# needed; when casatools/casatasks are not importable, minimal stand-ins are
+# installed so the task module loads outside a CASA install :
+#
+#    python3 regress_ugmrtpb.py [--size 64] [--repeat 3] [--atol 1e-5] [--rtol 1e-4]
+#
+# Exits with status 1 if any output differs by more than atol + rtol*|ref|.
+#
+################################################
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+import time
+import types
+import argparse
+import numpy as np
+from scipy import linalg
+
+try:
+   import casatasks
+   import casatools
+except ImportError:
+   # The engines under test are pure numpy/scipy and only touch casalog.
+   class _NullLog(object):
+      def post(self, *args, **kwargs): pass
+      def origin(self, *args, **kwargs): pass
+      def filter(self, *args, **kwargs): pass
+   class _NullTool(object):
+      def __init__(self, *args, **kwargs): pass
+   casatasks = types.ModuleType('casatasks')
+   casatasks.casalog = _NullLog()
+   casatasks.private = types.ModuleType('casatasks.private')
+   casatasks.private.casa_transition = types.ModuleType('casatasks.private.casa_transition')
+   casatasks.private.casa_transition.is_CASA6 = True
+   casatools = types.ModuleType('casatools')
+   for toolname in ['imager', 'image', 'quanta', 'measures', 'ms', 'vpmanager']:
+      setattr(casatools, toolname, _NullTool)
+   sys.modules['casatasks'] = casatasks
+   sys.modules['casatasks.private'] = casatasks.private
+   sys.modules['casatasks.private.casa_transition'] = casatasks.private.casa_transition
+   sys.modules['casatools'] = casatools
+
+import task_ugmrtpb
+
+# Execution paths to look for in task_ugmrtpb. 'serial' is the current code.
+# Any other path is picked up when task_ugmrtpb defines e.g. _linfit_tiled.
+PATHS = ['serial', 'tiled', 'parallel', 'analytic', 'fused']
+ENGINES = {'linfit' : '_linfit',
+           'dividePB' : '_dividePB',
+           'pbalpha' : '_pbAlphaFromTaylor',
+           'alphabeta' : '_alphaBetaFromTaylor'}
+
+NTERMS = [1, 2, 3, 4, 5]
+PBTHRESHOLDS = [0.0, 0.001, 0.1, 0.25, 0.5]
+
+####################################################
+# Frozen reference implementations. Do not edit.
+####################################################
+def _ref_linfit(ptays, freqs, pcube, wts, pbthresh):
+  nterms=len(ptays);
+  hess = np.zeros( (nterms,nterms) );
+  rhs = np.zeros( (nterms,1) );
+  soln = np.zeros( (nterms,1) );
+  shp = ptays[0].shape;
+
+  for ii in range(0,nterms):
+    for jj in range(0,nterms):
+       hess[ii,jj]= np.mean( freqs**(ii+jj) * wts);
+
+  normval = hess[0,0]
+  hess = hess/normval;
+
+  invhess = linalg.inv(hess);
+
+  for x in range(0,shp[0]):
+    for y in range(0,shp[1]):
+       if pcube[x,y,0] > pbthresh:
+           for ii in range(0,nterms):
+               rhs[ii,0]=np.mean( (freqs**(ii)) * pcube[x,y,:] * wts)/normval;
+           soln = np.dot(invhess,rhs);
+           for ii in range(0,nterms):
+               ptays[ii][x,y]=soln[ii,0];
+
+  return ptays;
+
+def _ref_dividePB(nterms,pbcoeffs,targetpbs):
+   if(len(pbcoeffs) != nterms or len(targetpbs) != nterms):
+        return [];
+   correctedpbs=[];
+
+   if(nterms==1):
+       det = pbcoeffs[0]
+       det[abs(det)==0.0]=1.0;
+       correctedpbs.append( targetpbs[0] / det);
+
+   if(nterms==2):
+       det = pbcoeffs[0]**2;
+       det[abs(det)==0.0]=1.0;
+       correctedpbs.append( pbcoeffs[0] * targetpbs[0] / det);
+       correctedpbs.append( (-1*pbcoeffs[1]*targetpbs[0] + pbcoeffs[0] * targetpbs[1])/det );
+
+   if(nterms==3):
+       det = pbcoeffs[0]**3;
+       det[abs(det)==0.0]=1.0;
+       correctedpbs.append( (pbcoeffs[0]**2) * targetpbs[0] / det);
+       correctedpbs.append( ( -1*pbcoeffs[0]*pbcoeffs[1]*targetpbs[0] + (pbcoeffs[0]**2)*targetpbs[1]   )/det );
+       correctedpbs.append( ( (pbcoeffs[1]**2 - pbcoeffs[0]*pbcoeffs[2])*targetpbs[0] + (-1*pbcoeffs[0]*pbcoeffs[1])*targetpbs[1] + (pbcoeffs[0]**2)*targetpbs[2]   )/det);
+
+   return correctedpbs;
+
+def _ref_pbalpha(ptay, pbthreshold):
+    ptay[0][ ptay[0] < pbthreshold  ] = 1.0
+    ptay[1][ ptay[0] < pbthreshold  ] = 0.0
+
+    alpha = ptay[1]/ptay[0]
+    return alpha
+
+def _ref_alphabeta(nterms, ptay, pres, threshold, calcerror):
+   beta = None;
+   aerror = None;
+
+   ptay[0][ptay[0]<1e-06]=1.0;
+   ptay[0][ptay[0]<threshold]=1.0;
+   ptay[1][ptay[0]<threshold]=0.0;
+   if(nterms>2):
+      ptay[2][ptay[0]<threshold]=0.0;
+
+   alpha = ptay[1]/ptay[0];
+
+   if(nterms>2):
+      beta = (ptay[2]/ptay[0]) - 0.5*alpha*(alpha-1);
+
+   if(calcerror):
+      pres[1][ptay[1]==0.0]=0.0
+      ptay[1][pres[1]==0.0]=1.0
+
+      aerror =  np.abs(alpha) * np.sqrt( (pres[0]/ptay[0])**2 + (pres[1]/ptay[1])**2 );
+
+   return alpha, beta, aerror;
+
+REFERENCE = {'linfit' : _ref_linfit,
+             'dividePB' : _ref_dividePB,
+             'pbalpha' : _ref_pbalpha,
+             'alphabeta' : _ref_alphabeta}
+
+####################################################
+# Synthetic inputs, shaped like the ia.getchunk() output used by the task.
+####################################################
+def _makeFreqs(nchan):
+   # Fractional offsets from a 0.4GHz reference, as in _calcTaylorFromCube.
+   reffreqGHz = 0.4
+   freqlist = np.linspace(0.3, 0.5, nchan)
+   return (np.array(freqlist,'f')-reffreqGHz)/reffreqGHz
+
+def _makePBCube(size, freqs):
+   # Gaussian beam that narrows with frequency. The outer region is exactly
+   # zero and rows are set to 0.1, 0.25 and 0.5. Only 0.25 and 0.5 are exact
+   # in float32, so those rows sit on the threshold.
+   x = np.arange(size) - size/2.0
+   r2 = (x[:,np.newaxis]**2 + x[np.newaxis,:]**2) / (size/4.0)**2
+   cube = np.zeros( (size, size, 1, len(freqs)), 'f' )
+   for chan in range(0,len(freqs)):
+       cube[:,:,0,chan] = np.exp( -0.5 * r2 * (1.0+freqs[chan])**2 )
+   cube[ r2 > 6.0 ] = 0.0
+   cube[0,:,0,:] = 0.1
+   cube[1,:,0,:] = 0.5
+   cube[2,:,0,:] = 0.25
+   return cube
+
+def _makeTaylorImages(size, nterms, seed):
+   # Point sources on a noise floor, with blocks of exact zeros and negatives.
+   rng = np.random.RandomState(seed)
+   ims = []
+   for tt in range(0,nterms):
+       im = rng.normal(0.0, 1e-4, (size,size,1,1)).astype('f')
+       for src in range(0,10):
+           px, py = rng.randint(0, size, 2)
+           im[px,py,0,0] += rng.uniform(1e-3, 1.0) * (-0.7)**tt
+       im[:size//8,:size//8] = 0.0
+       im[-size//8:,:size//8] *= -1.0
+       ims.append(im)
+   return ims
+
+def _makeCases(size):
+   cases = []
+   for nterms in NTERMS:
+       freqs = _makeFreqs(nterms+2)
+       wts = np.ones(freqs.shape)
+       pbcube = _makePBCube(size, freqs)
+       images = _makeTaylorImages(size, nterms, seed=nterms)
+       residuals = _makeTaylorImages(size, nterms, seed=100+nterms)
+       for pbthreshold in PBTHRESHOLDS:
+           name = 'nterms=%d pbthreshold=%g' % (nterms, pbthreshold)
+           # PB Taylor coefficients as _calcTaylorFromCube leaves them.
+           ptays = _ref_linfit([np.zeros((size,size,1,1),'f') for tt in range(0,nterms)],
+                               freqs, pbcube[:,:,0,:], wts, pbthreshold)
+           for tt in range(0,nterms):
+               ptays[tt][ ptays[0]<pbthreshold ] = 0.0
+           # Intensity pixels exactly at the threshold and at the 1e-06
+           # floor used by _alphaBetaFromTaylor.
+           thimages = _copy(images)
+           thimages[0][size//2,:] = pbthreshold
+           thimages[0][size//2+1,:] = 1e-06
+           cases.append( {'name' : name,
+                          'nterms' : nterms,
+                          'pbthreshold' : pbthreshold,
+                          'freqs' : freqs,
+                          'wts' : wts,
+                          'pbcube' : pbcube,
+                          'ptays' : ptays,
+                          'images' : images,
+                          'thimages' : thimages,
+                          'residuals' : residuals} )
+   return cases
+
+def _copy(arrs):
+   return [ np.array(a, copy=True) for a in arrs ]
+
+def _callers(case):
+   # One (label, engine, makeargs, collect) entry per engine call. makeargs
+   # builds fresh inputs for every call since the engines modify their
+   # arguments in place; collect turns the return value into a list of
+   # output arrays.
+   nterms = case['nterms']
+   pbthreshold = case['pbthreshold']
+   size = case['pbcube'].shape[0]
+   aslist = lambda outs : list(outs)
+   notnone = lambda outs : [ out for out in outs if out is not None ]
+   callers = []
+   callers.append( ('linfit', 'linfit',
+                    lambda : ( [np.zeros((size,size,1,1),'f') for tt in range(0,nterms)],
+                               case['freqs'], case['pbcube'][:,:,0,:], case['wts'], pbthreshold ),
+                    aslist) )
+   callers.append( ('dividePB', 'dividePB',
+                    lambda : ( nterms, _copy(case['ptays']), _copy(case['images']) ),
+                    aslist) )
+   if nterms > 1:
+       callers.append( ('pbalpha', 'pbalpha',
+                        lambda : ( _copy(case['ptays'][:2]), pbthreshold ),
+                        lambda out : [out]) )
+       callers.append( ('alphabeta', 'alphabeta',
+                        lambda : ( nterms, _copy(case['thimages']), _copy(case['residuals']), pbthreshold, True ),
+                        notnone) )
+       callers.append( ('alphabeta:noerr', 'alphabeta',
+                        lambda : ( nterms, _copy(case['thimages']), [], pbthreshold, False ),
+                        notnone) )
+   return callers
+
+####################################################
+# Comparison and timing.
+####################################################
+def _diff(ref, out):
+   # Max absolute and relative differences over the pixels that are finite
+   # in both. Non-finite pixels must be at the same places with equal values.
+   ref = np.asarray(ref, 'd')
+   out = np.asarray(out, 'd')
+   if ref.shape != out.shape:
+       return np.inf, np.inf, False
+   finite = np.isfinite(ref) & np.isfinite(out)
+   samenonfinite = np.array_equal(ref[~finite], out[~finite], equal_nan=True)
+   if not finite.any():
+       return 0.0, 0.0, samenonfinite
+   absdiff = np.abs(ref[finite] - out[finite])
+   scale = np.abs(ref[finite])
+   nonzero = scale > 0.0
+   maxabs = absdiff.max()
+   if nonzero.any():
+       maxrel = (absdiff[nonzero] / scale[nonzero]).max()
+   else:
+       maxrel = 0.0
+   if (absdiff[~nonzero] > 0.0).any():
+       maxrel = np.inf
+   return maxabs, maxrel, samenonfinite
+
+def _call(fn, args):
+   with np.errstate(divide='ignore', invalid='ignore'):
+       return fn(*args)
+
+def _timepair(makeargs, reffn, fn, repeat):
+   # Best-of-repeat wall time of reffn and fn. Inputs are built before the
+   # clock starts, both get an untimed warm-up call, and the order of the
+   # two alternates between repeats.
+   refout = _call(reffn, makeargs())
+   out = _call(fn, makeargs())
+   funcs = [reffn, fn]
+   best = [np.inf, np.inf]
+   for rep in range(0,repeat):
+       order = [0, 1] if rep%2 == 0 else [1, 0]
+       for ii in order:
+           args = makeargs()
+           start = time.perf_counter()
+           _call(funcs[ii], args)
+           best[ii] = min(best[ii], time.perf_counter() - start)
+   return refout, out, best[0], best[1]
+
+def _findPaths():
+   paths = {}
+   for path in PATHS:
+       engines = {}
+       for engine, fname in ENGINES.items():
+           if path != 'serial':
+               fname = fname + '_' + path
+           if hasattr(task_ugmrtpb, fname):
+               engines[engine] = getattr(task_ugmrtpb, fname)
+       if len(engines) > 0:
+           paths[path] = engines
+   return paths
+
+def run(size=64, repeat=3, atol=1e-5, rtol=1e-4):
+   # Silence the progress messages of the task functions.
+   task_ugmrtpb.casalog.filter('WARN')
+
+   paths = _findPaths()
+   print('Execution paths found : ' + str(sorted(paths.keys())))
+
+   fmt = '%-32s %-16s %-10s %-4s %12s %12s %9s  %s'
+   print(fmt % ('case', 'engine', 'path', 'out', 'max abs', 'max rel', 'speedup', 'status'))
+
+   nfail = 0
+   for case in _makeCases(size):
+       callers = _callers(case)
+       for label, engine, makeargs, collect in callers:
+           for path in sorted(paths.keys()):
+               if engine not in paths[path]:
+                   continue
+               refout, out, reftime, pathtime = _timepair(makeargs, REFERENCE[engine],
+                                                          paths[path][engine], repeat)
+               refouts = collect(refout)
+               outs = collect(out)
+               speedup = reftime / pathtime if pathtime > 0.0 else np.inf
+               if len(outs) != len(refouts):
+                   print(fmt % (case['name'], label, path, '-', '-', '-', '%.2fx' % speedup,
+                                'FAIL (%d outputs, expected %d)' % (len(outs), len(refouts))))
+                   nfail += 1
+                   continue
+               if len(refouts) == 0:
+                   print(fmt % (case['name'], label, path, '-', '-', '-', '%.2fx' % speedup, 'ok (no outputs)'))
+                   continue
+               for ii in range(0,len(refouts)):
+                   maxabs, maxrel, samenonfinite = _diff(refouts[ii], outs[ii])
+                   ok = samenonfinite and np.allclose(np.asarray(outs[ii], 'd'), np.asarray(refouts[ii], 'd'),
+                                                      rtol=rtol, atol=atol, equal_nan=True)
+                   if not ok:
+                       nfail += 1
+                   print(fmt % (case['name'], label, path, ii, '%.3e' % maxabs, '%.3e' % maxrel,
+                                '%.2fx' % speedup, 'ok' if ok else 'FAIL'))
+
+   if nfail > 0:
+       print(str(nfail) + ' output(s) differ from the reference')
+   else:
+       print('All outputs match the reference')
+   return nfail == 0
+
+if __name__ == '__main__':
+   parser = argparse.ArgumentParser(description='Compare task_ugmrtpb execution paths against the frozen reference implementation.')
+   parser.add_argument('--size', type=int, default=64, help='Image size in pixels')
+   parser.add_argument('--repeat', type=int, default=3, help='Timing repeats per engine (best is kept)')
+   parser.add_argument('--atol', type=float, default=1e-5, help='Absolute tolerance')
+   parser.add_argument('--rtol', type=float, default=1e-4, help='Relative tolerance')
+   args = parser.parse_args()
+   if not run(size=args.size, repeat=args.repeat, atol=args.atol, rtol=args.rtol):
+       sys.exit(1)
@@ -196,16 +196,21 @@ def _calcPBAlpha(pbtay=[], pbthreshold=0.1,pbalphaname='pbalpha.im'):
     ptay.append(ia.getchunk())
     ia.close()
 
-    ptay[0][ ptay[0] < pbthreshold  ] = 1.0
-    ptay[1][ ptay[0] < pbthreshold  ] = 0.0
-
-    alpha = ptay[1]/ptay[0]
+    alpha = _pbAlphaFromTaylor(ptay, pbthreshold)
 
     ia.open(pbalphaname)
     ia.putchunk(alpha)
     ia.calcmask(mask='"'+pbtay[0]+'"'+'>'+str(pbthreshold));
     ia.close()
 
+def _pbAlphaFromTaylor(ptay, pbthreshold):
+    # Array part of _calcPBAlpha. Modifies ptay in place.
+    ptay[0][ ptay[0] < pbthreshold  ] = 1.0
+    ptay[1][ ptay[0] < pbthreshold  ] = 0.0
+
+    alpha = ptay[1]/ptay[0]
+    return alpha
+
 
 #################################################
 def _makePBList(msname='',pbprefix='',field='',spwlist=[],chanlist=[], imsize=[], cellx='10.0arcsec', celly='10.0arcsec',phasecenter=''):
@@ -585,16 +590,7 @@ def  _compute_alpha_beta(imagename, nterms, taylorlist, residuallist, threshold,
    #ia.putchunk(intensity);
    #ia.close();
 
-   ptay[0][ptay[0]<1e-06]=1.0;
-   ptay[0][ptay[0]<threshold]=1.0;
-   ptay[1][ptay[0]<threshold]=0.0;
-   if(nterms>2):
-      ptay[2][ptay[0]<threshold]=0.0;
-
-   alpha = ptay[1]/ptay[0];
-
-   if(nterms>2):
-      beta = (ptay[2]/ptay[0]) - 0.5*alpha*(alpha-1);
+   alpha, beta, aerror = _alphaBetaFromTaylor(nterms, ptay, pres if calcerror else [], threshold, calcerror);
 
    ia.open(namealpha);
    ia.putchunk(alpha);
@@ -610,11 +606,6 @@ def  _compute_alpha_beta(imagename, nterms, taylorlist, residuallist, threshold,
 
    # calc error
    if(calcerror):
-
-      pres[1][ptay[1]==0.0]=0.0
-      ptay[1][pres[1]==0.0]=1.0
-
-      aerror =  np.abs(alpha) * np.sqrt( (pres[0]/ptay[0])**2 + (pres[1]/ptay[1])**2 );
       ia.open(nameerror);
       ia.putchunk(aerror);
       ia.calcmask(mask='"'+nameintensity+'"'+'>'+str(threshold));
@@ -635,6 +626,31 @@ def  _compute_alpha_beta(imagename, nterms, taylorlist, residuallist, threshold,
            if( _set_clean_beam(nameerror,beamshape) == False):
                 return False;
 
+####################################################
+# Array part of _compute_alpha_beta. Modifies ptay and pres in place.
+def _alphaBetaFromTaylor(nterms, ptay, pres, threshold, calcerror):
+   beta = None;
+   aerror = None;
+
+   ptay[0][ptay[0]<1e-06]=1.0;
+   ptay[0][ptay[0]<threshold]=1.0;
+   ptay[1][ptay[0]<threshold]=0.0;
+   if(nterms>2):
+      ptay[2][ptay[0]<threshold]=0.0;
+
+   alpha = ptay[1]/ptay[0];
+
+   if(nterms>2):
+      beta = (ptay[2]/ptay[0]) - 0.5*alpha*(alpha-1);
+
+   if(calcerror):
+      pres[1][ptay[1]==0.0]=0.0
+      ptay[1][pres[1]==0.0]=1.0
+
+      aerror =  np.abs(alpha) * np.sqrt( (pres[0]/ptay[0])**2 + (pres[1]/ptay[1])**2 );
+
+   return alpha, beta, aerror;
+
 ####################################################
 # Set the restoring beam to the new one.
 def _set_clean_beam(imname,beamshape):